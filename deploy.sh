@@ -96,8 +96,8 @@ deploy_local() {
     if ! command_exists tesseract; then
         log_warn "Tesseract OCR is not installed"
         log_info "Install it with:"
-        log_info "  macOS: brew install tesseract poppler"
-        log_info "  Ubuntu: sudo apt-get install tesseract-ocr poppler-utils"
+        log_info "  macOS: brew install tesseract"
+        log_info "  Ubuntu: sudo apt-get install tesseract-ocr"
         exit 1
     fi
     
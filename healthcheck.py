@@ -7,7 +7,8 @@ Validates all dependencies and configurations.
 import sys
 import os
 from pathlib import Path
-import subprocess
+import shutil
+from importlib.util import find_spec
 
 # Colors
 GREEN = '\033[92m'
@@ -15,6 +16,9 @@ RED = '\033[91m'
 YELLOW = '\033[93m'
 RESET = '\033[0m'
 
+# Parsed .env contents, shared by the checks below
+_env_cache = None
+
 def print_status(check_name, passed, message=""):
     status = f"{GREEN}✓{RESET}" if passed else f"{RED}✗{RESET}"
     print(f"{status} {check_name}", end="")
@@ -24,6 +28,32 @@ def print_status(check_name, passed, message=""):
         print()
     return passed
 
+def _read_env():
+    """Parse .env once and return its values as a dict (empty if missing)"""
+    global _env_cache
+    if _env_cache is not None:
+        return _env_cache
+    
+    env_path = Path(".env")
+    if not env_path.exists():
+        _env_cache = {}
+        return _env_cache
+    
+    try:
+        from dotenv import dotenv_values
+        _env_cache = dict(dotenv_values(env_path))
+    except ImportError:
+        _env_cache = {}
+        with open(env_path) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                _env_cache[key.strip()] = value.strip().strip("'\"")
+    
+    return _env_cache
+
 def check_python_version():
     """Check Python version >= 3.11"""
     version = sys.version_info
@@ -32,14 +62,8 @@ def check_python_version():
     return print_status("Python Version", passed, msg)
 
 def check_command_exists(cmd):
-    """Check if a command exists"""
-    try:
-        subprocess.run([cmd, "--version"], 
-                      stdout=subprocess.DEVNULL, 
-                      stderr=subprocess.DEVNULL)
-        return True
-    except FileNotFoundError:
-        return False
+    """Check if a command exists on PATH (without running it)"""
+    return shutil.which(cmd) is not None
 
 def check_tesseract():
     """Check Tesseract installation"""
@@ -59,13 +83,12 @@ def check_env_file():
     if not env_path.exists():
         return print_status(".env file", False, "File not found. Copy from .env.example")
     
-    with open(env_path) as f:
-        content = f.read()
+    api_key = _read_env().get("GEMINI_API_KEY")
     
-    if "your_api_key_here" in content:
+    if api_key == "your_api_key_here":
         return print_status("API Key", False, "Update GEMINI_API_KEY in .env")
     
-    if "GEMINI_API_KEY" not in content:
+    if api_key is None:
         return print_status("API Key", False, "GEMINI_API_KEY not found in .env")
     
     return print_status("API Key", True, "Configured")
@@ -87,28 +110,28 @@ def check_python_packages():
     """Check required Python packages"""
     required = [
         "google.generativeai",
-        "pdf2image",
+        "pypdfium2",
         "PIL",
         "pytesseract",
         "cv2",
         "yaml",
-        "tenacity",
-        "tqdm"
+        "tqdm",
+        "rapidfuzz"
     ]
     
+    # find_spec only locates the module; it doesn't execute it (cv2 and
+    # PIL are slow to import)
     all_installed = True
     for package in required:
         try:
-            if package == "PIL":
-                __import__("PIL")
-            elif package == "cv2":
-                __import__("cv2")
-            elif package == "yaml":
-                __import__("yaml")
-            else:
-                __import__(package)
+            installed = find_spec(package) is not None
+        except ModuleNotFoundError:
+            # Parent package of a dotted name (e.g. "google") is missing
+            installed = False
+        
+        if installed:
             print_status(f"Package: {package}", True)
-        except ImportError:
+        else:
             print_status(f"Package: {package}", False, "Not installed")
             all_installed = False
     
@@ -117,10 +140,7 @@ def check_python_packages():
 def check_gemini_connection():
     """Test Gemini API connection"""
     try:
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        api_key = os.getenv("GEMINI_API_KEY")
+        api_key = os.getenv("GEMINI_API_KEY") or _read_env().get("GEMINI_API_KEY")
         if not api_key or api_key == "your_api_key_here":
             return print_status("Gemini API Connection", False, "Invalid API key")
         
@@ -12,7 +12,7 @@ from dotenv import load_dotenv
 
 from src.book_processor import BookProcessor
 
-# Load environment variables
+# Load environment variables (exported values take precedence)
 load_dotenv()
 
 
@@ -97,14 +97,51 @@ Environment Variables:
     parser.add_argument(
         '--dpi',
         type=int,
+        default=200,
+        help='DPI for PDF to image conversion (default: 200)'
+    )
+    parser.add_argument(
+        '--escalation-dpi',
+        type=int,
         default=300,
-        help='DPI for PDF to image conversion (default: 300)'
+        help='DPI for re-rendering pages that come back empty '
+             '(default: 300; a value <= --dpi disables the retry)'
     )
     parser.add_argument(
         '--image-quality',
         type=int,
-        default=85,
-        help='JPEG quality for images (default: 85)'
+        default=75,
+        help='JPEG quality for images (default: 75)'
+    )
+    parser.add_argument(
+        '--target-long-edge',
+        type=int,
+        default=2048,
+        help='Downscale pages so the longest side is at most this many pixels (default: 2048)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=8,
+        help='Maximum concurrent Gemini requests (default: 8)'
+    )
+    parser.add_argument(
+        '--pages-per-request',
+        type=int,
+        default=3,
+        help='Pages sent to Gemini in a single request (default: 3)'
+    )
+    parser.add_argument(
+        '--render-workers',
+        type=int,
+        default=None,
+        help='Processes used to rasterize PDF pages (default: half the CPU cores)'
+    )
+    parser.add_argument(
+        '--render-batch-size',
+        type=int,
+        default=8,
+        help='Pages rasterized per render job (default: 8)'
     )
     parser.add_argument(
         '--log-level',
@@ -140,7 +177,14 @@ Environment Variables:
             gemini_model=os.getenv('GEMINI_MODEL', 'gemini-1.5-flash-latest'),
             cache_dir=args.cache_dir,
             dpi=args.dpi,
-            image_quality=args.image_quality
+            escalation_dpi=args.escalation_dpi,
+            image_quality=args.image_quality,
+            target_long_edge=args.target_long_edge,
+            concurrency=args.concurrency,
+            pages_per_request=args.pages_per_request,
+            use_cache=not args.no_cache,
+            render_batch_size=args.render_batch_size,
+            render_workers=args.render_workers
         )
         
         # Test API connection
@@ -167,7 +211,8 @@ Environment Variables:
         
     except KeyboardInterrupt:
         logger.warning("\n✗ Processing interrupted by user")
-        logger.info("Progress has been saved. Use --resume to continue.")
+        if not args.no_cache:
+            logger.info("Progress has been saved. Use --resume to continue.")
         sys.exit(130)
     except Exception as e:
         logger.error(f"✗ Processing failed: {str(e)}", exc_info=True)
@@ -6,7 +6,7 @@ __version__ = "1.0.0"
 __author__ = "Your Name"
 
 from .book_processor import BookProcessor
-from .gemini_client import GeminiClient
+from .gemini_client import GeminiClient, PageResult
 from .pdf_handler import PDFHandler
 from .context_manager import ContextManager
 from .markdown_stitcher import MarkdownStitcher
@@ -14,6 +14,7 @@ from .markdown_stitcher import MarkdownStitcher
 __all__ = [
     'BookProcessor',
     'GeminiClient',
+    'PageResult',
     'PDFHandler',
     'ContextManager',
     'MarkdownStitcher'
@@ -1,11 +1,13 @@
+import asyncio
+import contextlib
 import logging
-import json
 import os
+import pickle
 from pathlib import Path
-from tqdm import tqdm
-from typing import Optional
+from tqdm.asyncio import tqdm
+from typing import BinaryIO, Optional, TextIO
 
-from .gemini_client import GeminiClient
+from .gemini_client import GeminiClient, PageResult
 from .pdf_handler import PDFHandler
 from .context_manager import ContextManager
 from .markdown_stitcher import MarkdownStitcher
@@ -13,12 +15,17 @@ from .markdown_stitcher import MarkdownStitcher
 logger = logging.getLogger(__name__)
 
 
+# Leading bytes of every cache file; files without it (e.g. JSON caches
+# from older versions) are discarded instead of being misread
+_CACHE_MAGIC = b'BOOKOCR-CACHE/1\n'
+
+
 class BookProcessor:
     """
     Main orchestrator for processing PDF books into markdown.
     
     Handles:
-    - Page-by-page processing
+    - Concurrent page processing (bounded number of in-flight requests)
     - Context carryover between pages
     - Progress tracking and resume capability
     - Cache management
@@ -29,13 +36,30 @@ class BookProcessor:
         gemini_api_key: str,
         gemini_model: str = "gemini-1.5-flash-latest",
         cache_dir: str = "./cache",
-        dpi: int = 300,
-        image_quality: int = 85
+        dpi: int = 200,
+        image_quality: int = 75,
+        target_long_edge: int = 2048,
+        concurrency: int = 8,
+        pages_per_request: int = 3,
+        use_cache: bool = True,
+        render_batch_size: int = 8,
+        render_workers: Optional[int] = None,
+        escalation_dpi: int = 300
     ):
         self.gemini_client = GeminiClient(gemini_api_key, gemini_model)
-        self.pdf_handler = PDFHandler(dpi, image_quality)
+        self.pdf_handler = PDFHandler(
+            dpi,
+            image_quality,
+            target_long_edge,
+            batch_size=render_batch_size,
+            workers=render_workers,
+            escalation_dpi=escalation_dpi
+        )
         self.context_manager = ContextManager()
         self.markdown_stitcher = MarkdownStitcher()
+        self.concurrency = max(1, concurrency)
+        self.pages_per_request = max(1, pages_per_request)
+        self.use_cache = use_cache
         
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
@@ -75,69 +99,51 @@ class BookProcessor:
         
         logger.info(f"Processing pages {start_page} to {end_page} of {total_pages}")
         
-        # Load cache if resuming
+        # Load cache if resuming; otherwise start a fresh cache file since
+        # new entries are appended to it. With caching disabled the cache
+        # file is neither read nor written.
         cache_file = self._get_cache_file(pdf_path)
-        processed_pages = self._load_cache(cache_file) if resume else {}
+        if self.use_cache and resume:
+            processed_pages = self._load_cache(cache_file)
+        else:
+            processed_pages = {}
+            if self.use_cache:
+                cache_file.unlink(missing_ok=True)
         
         # Process pages
         stats = {
             'total_pages': end_page - start_page + 1,
             'processed': 0,
             'cached': len(processed_pages),
-            'errors': 0
+            'errors': 0,
+            'rerendered': 0
         }
         
         try:
-            with tqdm(total=stats['total_pages'], desc="Processing pages") as pbar:
-                for page_num, page_image in self.pdf_handler.extract_pages(
-                    pdf_path, start_page, end_page
-                ):
-                    # Check cache first
-                    if str(page_num) in processed_pages:
-                        logger.debug(f"Using cached result for page {page_num}")
-                        result = processed_pages[str(page_num)]
-                    else:
-                        # Process page
-                        result = self._process_single_page(
-                            page_image,
-                            page_num,
-                            self.context_manager.get_context_for_next_page()
-                        )
-                        
-                        if result:
-                            # Cache the result
-                            processed_pages[str(page_num)] = result
-                            self._save_cache(cache_file, processed_pages)
-                        else:
-                            stats['errors'] += 1
-                            logger.error(f"Failed to process page {page_num}")
-                            pbar.update(1)
-                            continue
-                    
-                    # Add to stitcher
-                    self.markdown_stitcher.add_page(
-                        result['markdown'],
-                        page_num
-                    )
-                    
-                    # Update context for next page
-                    if result['ends_incomplete'] and result['incomplete_text']:
-                        self.context_manager.set_incomplete_text(
-                            result['incomplete_text'],
-                            page_num
-                        )
-                    else:
-                        self.context_manager.clear_context()
-                    
-                    stats['processed'] += 1
-                    pbar.update(1)
-            
-            # Stitch all pages together
-            logger.info("Stitching pages into final document...")
-            final_markdown = self.markdown_stitcher.stitch_all()
-            
-            # Save output
-            self._save_output(output_path, final_markdown)
+            # Pages are stitched and written as they complete (cached pages
+            # are replayed), so the output is rewritten from the start
+            with self._open_output(output_path) as output, \
+                    self._open_cache(cache_file) as cache, \
+                    tqdm(
+                        total=stats['total_pages'],
+                        desc="Processing pages",
+                        mininterval=0.5,
+                        miniters=max(1, stats['total_pages'] // 200)
+                    ) as pbar:
+                asyncio.run(self._process_pages_async(
+                    pdf_path,
+                    self.pdf_handler.extract_pages(pdf_path, start_page, end_page),
+                    processed_pages,
+                    cache,
+                    output,
+                    stats,
+                    pbar,
+                    concurrency=self.concurrency
+                ))
+            
+            logger.info(
+                f"Saved {self.markdown_stitcher.chars_written} characters to {output_path}"
+            )
             
             # Update stats
             stats.update(self.markdown_stitcher.get_stats())
@@ -152,25 +158,168 @@ class BookProcessor:
             
         except KeyboardInterrupt:
             logger.warning("Processing interrupted by user")
-            logger.info(f"Progress saved to cache: {cache_file}")
+            if self.use_cache:
+                logger.info(f"Progress saved to cache: {cache_file}")
             raise
         except Exception as e:
             logger.error(f"Processing failed: {str(e)}")
             raise
     
-    def _process_single_page(
+    async def _process_pages_async(
+        self,
+        pdf_path: str,
+        pages_iter,
+        processed_pages: dict,
+        cache: Optional[BinaryIO],
+        output: TextIO,
+        stats: dict,
+        pbar,
+        concurrency: int = 8
+    ):
+        """
+        Process pages with up to `concurrency` Gemini requests in flight.
+        
+        Pages are pulled from the iterator in chunks of `concurrency` requests
+        of `pages_per_request` pages each; the requests of a chunk are sent
+        concurrently and their results are fed to the stitcher and context
+        manager in page order.
+        """
+        chunk_size = concurrency * self.pages_per_request
+        chunk = []
+        for page in pages_iter:
+            chunk.append(page)
+            if len(chunk) >= chunk_size:
+                await self._process_chunk(
+                    pdf_path, chunk, processed_pages, cache, output, stats, pbar
+                )
+                chunk = []
+        
+        if chunk:
+            await self._process_chunk(
+                pdf_path, chunk, processed_pages, cache, output, stats, pbar
+            )
+    
+    async def _process_chunk(
+        self,
+        pdf_path: str,
+        chunk: list,
+        processed_pages: dict,
+        cache: Optional[BinaryIO],
+        output: TextIO,
+        stats: dict,
+        pbar
+    ):
+        """Process one chunk of (page_num, image) pairs concurrently."""
+        # Uncached pages are grouped into runs of consecutive pages, at most
+        # pages_per_request per Gemini request. Context carryover is
+        # best-effort: a group only gets the previous page's incomplete text
+        # when that page was already finished before this chunk was
+        # submitted (previous chunk or cache hit).
+        context = self.context_manager.current_context
+        groups = []
+        group = None
+        for page_num, page_image in chunk:
+            cached = processed_pages.get(str(page_num))
+            if cached is not None:
+                context = cached.incomplete_text if cached.ends_incomplete else None
+                group = None
+                continue
+            
+            if group is None or len(group[0]) >= self.pages_per_request:
+                group = ([], [], context)
+                groups.append(group)
+            group[0].append(page_num)
+            group[1].append(page_image)
+            context = None
+        
+        batches = await asyncio.gather(*(
+            self._process_page_group(images, page_numbers, group_context)
+            for page_numbers, images, group_context in groups
+        ))
+        
+        fresh = {}
+        for (page_numbers, _, _), results in zip(groups, batches):
+            fresh.update(zip(page_numbers, results))
+        
+        # Gemini gives no confidence score; treat pages that came back empty
+        # as unreadable at the normal DPI and try them once more at a higher
+        # one. Failed requests (None) already used up their retries on API
+        # errors and stay failed.
+        retry = [
+            page_num for page_num, result in fresh.items()
+            if result is not None and not result.markdown.strip()
+        ]
+        if retry and self.pdf_handler.escalation_dpi > self.pdf_handler.dpi:
+            contexts = {
+                page_numbers[0]: group_context
+                for page_numbers, _, group_context in groups
+            }
+            retried = await self._rerender_pages(pdf_path, retry, contexts)
+            for page_num, result in zip(retry, retried):
+                if result is not None and result.markdown.strip():
+                    fresh[page_num] = result
+                    stats['rerendered'] += 1
+        
+        for page_num, _ in chunk:
+            if page_num not in fresh:
+                logger.debug("Using cached result for page %d", page_num)
+                result = processed_pages[str(page_num)]
+            else:
+                result = fresh[page_num]
+                
+                if result:
+                    # Cache the result
+                    processed_pages[str(page_num)] = result
+                    if cache is not None:
+                        self._save_cache(cache, page_num, result)
+                else:
+                    stats['errors'] += 1
+                    logger.error(f"Failed to process page {page_num}")
+                    continue
+            
+            # Stitch and write to the output file
+            self.markdown_stitcher.write_page(
+                output,
+                result.markdown,
+                page_num
+            )
+            
+            # Update context for next page
+            if result.ends_incomplete and result.incomplete_text:
+                self.context_manager.set_incomplete_text(
+                    result.incomplete_text,
+                    page_num
+                )
+            else:
+                self.context_manager.clear_context()
+            
+            stats['processed'] += 1
+        
+        # Flush the cache once per chunk rather than once per page
+        if cache is not None:
+            cache.flush()
+        
+        # One progress update per chunk (resumes replay many cached pages)
+        pbar.update(len(chunk))
+    
+    async def _process_single_page(
         self,
         page_image,
         page_number: int,
-        context: Optional[str]
-    ) -> Optional[dict]:
+        context: Optional[str],
+        long_edge: Optional[int] = None
+    ) -> Optional[PageResult]:
         """Process a single page with Gemini."""
         try:
-            # Optimize image
-            optimized = self.pdf_handler.optimize_image(page_image)
+            # Optimize image off the event loop so other requests keep flowing
+            optimized = await asyncio.to_thread(
+                self.pdf_handler.optimize_image,
+                page_image,
+                long_edge
+            )
             
             # Call Gemini
-            result = self.gemini_client.extract_page_markdown(
+            result = await self.gemini_client.aextract_page_markdown(
                 optimized,
                 context_from_previous=context,
                 page_number=page_number
@@ -182,42 +331,148 @@ class BookProcessor:
             logger.error(f"Error processing page {page_number}: {str(e)}")
             return None
     
+    async def _process_page_group(
+        self,
+        page_images: list,
+        page_numbers: list,
+        context: Optional[str]
+    ) -> list:
+        """Process consecutive pages with one Gemini request (None per failed page)."""
+        if len(page_numbers) == 1:
+            return [await self._process_single_page(page_images[0], page_numbers[0], context)]
+        
+        label = f"{page_numbers[0]}-{page_numbers[-1]}"
+        try:
+            # Optimize images off the event loop so other requests keep flowing
+            optimized = await asyncio.to_thread(
+                lambda: [self.pdf_handler.optimize_image(img) for img in page_images]
+            )
+            
+            # Call Gemini
+            return await self.gemini_client.aextract_pages_markdown(
+                optimized,
+                page_numbers,
+                context_from_previous=context
+            )
+            
+        except Exception as e:
+            logger.error(f"Error processing pages {label}: {str(e)}")
+            return [None] * len(page_numbers)
+    
+    async def _rerender_pages(
+        self,
+        pdf_path: str,
+        page_numbers: list,
+        contexts: dict
+    ) -> list:
+        """
+        Render pages again at escalation_dpi and OCR each one on its own.
+        
+        The upload size limit is raised by the same factor as the DPI so
+        the extra resolution isn't thrown away by the downscale.
+        
+        Returns:
+            One PageResult (or None on failure) per page number
+        """
+        handler = self.pdf_handler
+        dpi = handler.escalation_dpi
+        long_edge = handler.target_long_edge * dpi // handler.dpi
+        logger.info(f"Retrying {len(page_numbers)} page(s) at {dpi} DPI: {page_numbers}")
+        
+        try:
+            # PDFium isn't thread-safe, so render them all in one thread
+            images = await asyncio.to_thread(
+                lambda: [handler.rasterize_page(pdf_path, n, dpi) for n in page_numbers]
+            )
+        except Exception as e:
+            logger.error(f"Error re-rendering pages {page_numbers}: {str(e)}")
+            return [None] * len(page_numbers)
+        
+        return await asyncio.gather(*(
+            self._process_single_page(image, page_num, contexts.get(page_num), long_edge)
+            for page_num, image in zip(page_numbers, images)
+        ))
+    
     def _get_cache_file(self, pdf_path: str) -> Path:
         """Generate cache file path based on PDF name."""
         pdf_name = Path(pdf_path).stem
-        return self.cache_dir / f"{pdf_name}_cache.json"
+        return self.cache_dir / f"{pdf_name}_cache.pkl"
     
     def _load_cache(self, cache_file: Path) -> dict:
-        """Load cached results."""
+        """
+        Load cached results from the append-only pickle cache.
+        
+        Later records for the same page win. A truncated final record
+        (e.g. from an interrupted run) is cut off so appends stay readable.
+        """
         if not cache_file.exists():
             return {}
         
+        data = {}
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(cache_file, 'rb') as f:
+                if f.read(len(_CACHE_MAGIC)) != _CACHE_MAGIC:
+                    logger.warning(f"Discarding cache in unknown format: {cache_file}")
+                    f.close()
+                    cache_file.unlink()
+                    return {}
+                
+                good_end = f.tell()
+                while True:
+                    try:
+                        page_num, result = pickle.load(f)
+                    except EOFError:
+                        break
+                    except Exception:
+                        logger.warning(f"Dropping truncated cache record in {cache_file}")
+                        break
+                    if isinstance(result, dict):
+                        # Written before results were PageResult instances
+                        result = PageResult(**result)
+                    data[str(page_num)] = result
+                    good_end = f.tell()
+            
+            if good_end < cache_file.stat().st_size:
+                os.truncate(cache_file, good_end)
+            
             logger.info(f"Loaded cache with {len(data)} pages")
             return data
         except Exception as e:
             logger.warning(f"Could not load cache: {str(e)}")
             return {}
     
-    def _save_cache(self, cache_file: Path, data: dict):
-        """Save results to cache."""
+    def _open_cache(self, cache_file: Path):
+        """
+        Open the cache for appending (buffered; flushed by the caller).
+        
+        Returns a null context (yielding None) when caching is disabled or
+        the file can't be opened.
+        """
+        if not self.use_cache:
+            return contextlib.nullcontext()
+        
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            f = open(cache_file, 'ab', buffering=1 << 16)
+            if f.tell() == 0:
+                f.write(_CACHE_MAGIC)
+            return f
+        except Exception as e:
+            logger.warning(f"Could not open cache: {str(e)}")
+            return contextlib.nullcontext()
+    
+    def _save_cache(self, cache: BinaryIO, page_num: int, result: PageResult):
+        """Append a single page result to the cache."""
+        try:
+            pickle.dump((page_num, result), cache, protocol=pickle.HIGHEST_PROTOCOL)
         except Exception as e:
             logger.warning(f"Could not save cache: {str(e)}")
     
-    def _save_output(self, output_path: str, markdown: str):
-        """Save final markdown to file."""
+    def _open_output(self, output_path: str) -> TextIO:
+        """Open the markdown output file for streaming writes (1 MB buffer)."""
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(markdown)
-        
-        logger.info(f"Saved {len(markdown)} characters to {output_path}")
+        return open(output_file, 'w', encoding='utf-8', buffering=1 << 20)
     
     def _print_stats(self, stats: dict):
         """Print processing statistics."""
@@ -10,6 +10,10 @@ class ContextManager:
     
     Tracks incomplete text fragments from page endings and ensures
     they're properly joined with the next page's beginning.
+    
+    Attributes:
+        current_context: Pending incomplete fragment for the next page, or
+            None. Safe to read directly in hot loops.
     """
     
     def __init__(self):
@@ -93,11 +97,8 @@ class ContextManager:
         if not markdown:
             return False, None
         
-        lines = markdown.strip().split('\n')
-        if not lines:
-            return False, None
-        
-        last_line = lines[-1].strip()
+        # Only the last line matters; avoid splitting the whole page
+        last_line = markdown.rstrip().rpartition('\n')[2].strip()
         if not last_line:
             return False, None
         
@@ -106,7 +107,7 @@ class ContextManager:
             return False, None
         
         # Get the last "word" (might be incomplete)
-        words = last_line.split()
+        words = last_line.rsplit(None, 1)
         if not words:
             return False, None
         
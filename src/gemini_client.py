@@ -1,12 +1,96 @@
 import google.generativeai as genai
-from tenacity import retry, stop_after_attempt, wait_exponential
+from google.api_core import exceptions as google_exceptions
 from PIL import Image
+import asyncio
 import os
+import re
+import time
 import logging
-from typing import Optional
+from dataclasses import dataclass
+from typing import List, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# Rate limiting and transient server-side failures; anything else fails fast
+_TRANSIENT_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.ServiceUnavailable,
+)
+
+# Opening ```markdown fence plus, when present, the block up to the closing fence
+_MARKDOWN_BLOCK_RE = re.compile(r"```markdown(?:(?P<md>.*?)```)?", re.DOTALL)
+
+# {EOL} and {INCOMPLETE: ...} markers, matched in a single scan
+_MARKER_RE = re.compile(r"(?P<eol>\{EOL\})|\{INCOMPLETE:(?P<inc>[^}]*)\}")
+
+# Per-page blocks of a batched (multi-page) response
+_PAGE_BLOCK_RE = re.compile(r"<<PAGE\s+(?P<num>\d+)>>(?P<body>.*?)<</PAGE>>", re.DOTALL)
+
+# Prompts are constant apart from the context fragment and page labels
+_BASE_PROMPT = """Extract ALL text from this book page and convert it to clean markdown format.
+
+FORMATTING RULES:
+- Use ## for chapter titles, ### for sections, #### for subsections
+- Preserve **bold** and *italic* formatting
+- Convert lists to proper markdown (- or 1. 2. 3.)
+- Tables should use markdown table syntax
+- Preserve paragraph breaks (double newline)
+- Remove headers/footers/page numbers
+
+CRITICAL - HANDLING INCOMPLETE TEXT:
+- If text at the BOTTOM of the page ends mid-word or mid-sentence, mark it with {EOL} tag
+- Extract the incomplete fragment and add it after {INCOMPLETE: fragment text here}
+- Example: "The quick brown fox jum{EOL}{INCOMPLETE: jum}"
+
+OUTPUT FORMAT:
+```markdown
+[Your markdown content here]
+```
+
+If incomplete text detected:
+{EOL}
+{INCOMPLETE: incomplete text fragment}
+"""
+
+_CONTEXT_TEMPLATE = """
+CONTEXT FROM PREVIOUS PAGE:
+The previous page ended with incomplete text: "{context}"
+Start your extraction by completing this text naturally, then continue with the rest of the page.
+"""
+
+_BATCH_TEMPLATE = """The {count} attached images are consecutive book pages, in order.
+Their page numbers are: {labels}.
+
+Apply the instructions below to EACH page separately and wrap every page's output in its own block:
+
+<<PAGE {first}>>
+[output for that page, in the OUTPUT FORMAT below]
+<</PAGE>>
+
+Emit exactly one block per page, in page order. If text runs from one of these pages onto the next,
+keep each page's text in its own block and mark the end of the earlier page as incomplete.
+"""
+
+
+class MalformedResponseError(ValueError):
+    """Gemini's response didn't follow the requested output format."""
+
+
+@dataclass(slots=True)
+class PageResult:
+    """Extraction result for a single page."""
+    markdown: str
+    ends_incomplete: bool = False
+    incomplete_text: Optional[str] = None
+
+
+def _image_part(image: Union[bytes, Image.Image]):
+    """Wrap encoded JPEG bytes as an inline blob; PIL images pass through."""
+    if isinstance(image, bytes):
+        return {'mime_type': 'image/jpeg', 'data': image}
+    return image
+
 
 class GeminiClient:
     """Handles all Gemini API interactions with retry logic and rate limiting."""
@@ -21,127 +105,243 @@ class GeminiClient:
         self.model_name = model_name
         self.max_retries = max_retries
         
-        genai.configure(api_key=api_key)
+        # Pin the gRPC transport: one long-lived channel is shared by every
+        # request made through self.model, so pages and retries don't pay
+        # for new TCP/TLS handshakes
+        genai.configure(api_key=api_key, transport='grpc')
         self.model = genai.GenerativeModel(model_name)
         
         logger.info(f"Initialized Gemini client with model: {model_name}")
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        reraise=True
-    )
     def extract_page_markdown(
         self,
-        image: Image.Image,
+        image: Union[bytes, Image.Image],
         context_from_previous: Optional[str] = None,
         page_number: int = 1
-    ) -> dict:
+    ) -> PageResult:
         """
         Extract text from a page image and convert to markdown.
         
         Args:
-            image: PIL Image of the page
+            image: JPEG bytes (or PIL Image) of the page
             context_from_previous: Text fragment from previous page (if any)
             page_number: Current page number for logging
             
         Returns:
-            dict with keys: 'markdown', 'ends_incomplete', 'incomplete_text'
+            PageResult with the markdown and incomplete-text markers
         """
         prompt = self._build_extraction_prompt(context_from_previous)
         
-        try:
-            logger.info(f"Processing page {page_number} with Gemini...")
-            response = self.model.generate_content([prompt, image])
-            
-            # Parse the response
-            result = self._parse_response(response.text)
-            logger.info(f"Page {page_number} processed successfully")
-            
-            return result
+        return self._generate(
+            [prompt, _image_part(image)],
+            self._parse_response,
+            f"page {page_number}"
+        )
+    
+    async def aextract_page_markdown(
+        self,
+        image: Union[bytes, Image.Image],
+        context_from_previous: Optional[str] = None,
+        page_number: int = 1
+    ) -> PageResult:
+        """
+        Async variant of extract_page_markdown.
+        
+        Lets the caller keep several page requests in flight at once.
+        Takes the same arguments and returns the same PageResult.
+        """
+        prompt = self._build_extraction_prompt(context_from_previous)
+        
+        return await self._agenerate(
+            [prompt, _image_part(image)],
+            self._parse_response,
+            f"page {page_number}"
+        )
+    
+    def extract_pages_markdown(
+        self,
+        images: List[Union[bytes, Image.Image]],
+        page_numbers: List[int],
+        context_from_previous: Optional[str] = None
+    ) -> List[Optional[PageResult]]:
+        """
+        Extract several consecutive pages with a single Gemini request.
+        
+        Args:
+            images: JPEG bytes (or PIL Images) of the pages, in page order
+            page_numbers: Page number of each image
+            context_from_previous: Text fragment from the page before the first one
             
-        except Exception as e:
-            logger.error(f"Error processing page {page_number}: {str(e)}")
-            raise
+        Returns:
+            One PageResult per page,
+            or None for pages missing from the response
+        """
+        prompt = self._build_batch_prompt(page_numbers, context_from_previous)
+        
+        return self._generate(
+            [prompt, *map(_image_part, images)],
+            lambda text: self._parse_batch_response(text, page_numbers),
+            f"pages {page_numbers[0]}-{page_numbers[-1]}",
+            retry_on=_TRANSIENT_ERRORS + (MalformedResponseError,)
+        )
     
-    def _build_extraction_prompt(self, context: Optional[str]) -> str:
-        """Build the prompt for Gemini with context handling."""
+    async def aextract_pages_markdown(
+        self,
+        images: List[Union[bytes, Image.Image]],
+        page_numbers: List[int],
+        context_from_previous: Optional[str] = None
+    ) -> List[Optional[PageResult]]:
+        """Async variant of extract_pages_markdown."""
+        prompt = self._build_batch_prompt(page_numbers, context_from_previous)
         
-        base_prompt = """Extract ALL text from this book page and convert it to clean markdown format.
-
-FORMATTING RULES:
-- Use ## for chapter titles, ### for sections, #### for subsections
-- Preserve **bold** and *italic* formatting
-- Convert lists to proper markdown (- or 1. 2. 3.)
-- Tables should use markdown table syntax
-- Preserve paragraph breaks (double newline)
-- Remove headers/footers/page numbers
-
-CRITICAL - HANDLING INCOMPLETE TEXT:
-- If text at the BOTTOM of the page ends mid-word or mid-sentence, mark it with {EOL} tag
-- Extract the incomplete fragment and add it after {INCOMPLETE: fragment text here}
-- Example: "The quick brown fox jum{EOL}{INCOMPLETE: jum}"
-
-OUTPUT FORMAT:
-```markdown
-[Your markdown content here]
-```
-
-If incomplete text detected:
-{EOL}
-{INCOMPLETE: incomplete text fragment}
-"""
+        return await self._agenerate(
+            [prompt, *map(_image_part, images)],
+            lambda text: self._parse_batch_response(text, page_numbers),
+            f"pages {page_numbers[0]}-{page_numbers[-1]}",
+            retry_on=_TRANSIENT_ERRORS + (MalformedResponseError,)
+        )
+    
+    def _generate(self, contents: list, parse, label: str, retry_on=_TRANSIENT_ERRORS):
+        """
+        Call Gemini and parse the response text, retrying transient errors.
         
+        Makes up to max_retries attempts with exponential backoff
+        (2s, 4s, 8s, ... capped at 10s) and re-raises the last error.
+        """
+        attempts = max(1, self.max_retries)
+        for attempt in range(1, attempts + 1):
+            try:
+                logger.info(f"Processing {label} with Gemini...")
+                response = self.model.generate_content(contents)
+                
+                # Parse the response
+                result = parse(response.text)
+                logger.info(f"Processed {label} successfully")
+                
+                return result
+                
+            except retry_on as e:
+                if attempt == attempts:
+                    logger.error(f"Error processing {label}: {str(e)}")
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(
+                    f"Retrying {label} in {delay}s (attempt {attempt}/{attempts}): {str(e)}"
+                )
+                time.sleep(delay)
+            except Exception as e:
+                logger.error(f"Error processing {label}: {str(e)}")
+                raise
+    
+    async def _agenerate(self, contents: list, parse, label: str, retry_on=_TRANSIENT_ERRORS):
+        """Async variant of _generate (backs off without blocking the event loop)."""
+        attempts = max(1, self.max_retries)
+        for attempt in range(1, attempts + 1):
+            try:
+                logger.info(f"Processing {label} with Gemini...")
+                response = await self.model.generate_content_async(contents)
+                
+                # Parse the response
+                result = parse(response.text)
+                logger.info(f"Processed {label} successfully")
+                
+                return result
+                
+            except retry_on as e:
+                if attempt == attempts:
+                    logger.error(f"Error processing {label}: {str(e)}")
+                    raise
+                delay = self._retry_delay(attempt)
+                logger.warning(
+                    f"Retrying {label} in {delay}s (attempt {attempt}/{attempts}): {str(e)}"
+                )
+                await asyncio.sleep(delay)
+            except Exception as e:
+                logger.error(f"Error processing {label}: {str(e)}")
+                raise
+    
+    @staticmethod
+    def _retry_delay(attempt: int) -> int:
+        """Backoff in seconds before the next attempt."""
+        return min(10, 2 ** attempt)
+    
+    def _build_extraction_prompt(self, context: Optional[str]) -> str:
+        """Build the prompt for Gemini with context handling."""
         if context:
-            context_section = f"""
-CONTEXT FROM PREVIOUS PAGE:
-The previous page ended with incomplete text: "{context}"
-Start your extraction by completing this text naturally, then continue with the rest of the page.
-"""
-            return context_section + base_prompt
+            return _CONTEXT_TEMPLATE.format(context=context) + _BASE_PROMPT
         
-        return base_prompt
+        return _BASE_PROMPT
     
-    def _parse_response(self, response_text: str) -> dict:
-        """Parse Gemini response to extract markdown and context markers."""
+    def _build_batch_prompt(self, page_numbers: List[int], context: Optional[str]) -> str:
+        """Build the prompt for a multi-page request."""
+        batch_section = _BATCH_TEMPLATE.format(
+            count=len(page_numbers),
+            labels=", ".join(str(n) for n in page_numbers),
+            first=page_numbers[0]
+        )
         
-        # Initialize result
-        result = {
-            'markdown': '',
-            'ends_incomplete': False,
-            'incomplete_text': None
+        return batch_section + self._build_extraction_prompt(context)
+    
+    def _parse_batch_response(
+        self,
+        response_text: str,
+        page_numbers: List[int]
+    ) -> List[Optional[PageResult]]:
+        """Split a multi-page response into per-page results."""
+        blocks = {
+            int(block.group('num')): block.group('body')
+            for block in _PAGE_BLOCK_RE.finditer(response_text)
         }
+        if not blocks:
+            raise MalformedResponseError("Batched response contained no <<PAGE n>> blocks")
+        
+        results = []
+        for page_number in page_numbers:
+            body = blocks.get(page_number)
+            if body is None:
+                logger.warning(f"No output block for page {page_number} in batched response")
+                results.append(None)
+            else:
+                results.append(self._parse_response(body))
+        
+        return results
+    
+    def _parse_response(self, response_text: str) -> PageResult:
+        """Parse Gemini response to extract markdown and context markers."""
         
         # Extract markdown content (between ```markdown and ```)
-        if '```markdown' in response_text:
-            start = response_text.find('```markdown') + len('```markdown')
-            end = response_text.find('```', start)
-            if end != -1:
-                result['markdown'] = response_text[start:end].strip()
-        else:
+        block = _MARKDOWN_BLOCK_RE.search(response_text)
+        if block is None:
             # Fallback: use entire response
-            result['markdown'] = response_text.strip()
+            markdown = response_text
+        else:
+            markdown = block.group('md') or ''
         
         # Check for incomplete text markers
-        if '{EOL}' in response_text:
-            result['ends_incomplete'] = True
-            
-            # Extract incomplete text
-            if '{INCOMPLETE:' in response_text:
-                incomplete_start = response_text.find('{INCOMPLETE:') + len('{INCOMPLETE:')
-                incomplete_end = response_text.find('}', incomplete_start)
-                if incomplete_end != -1:
-                    result['incomplete_text'] = response_text[incomplete_start:incomplete_end].strip()
+        ends_incomplete = False
+        incomplete_text = None
+        for marker in _MARKER_RE.finditer(response_text):
+            if marker.group('eol'):
+                ends_incomplete = True
+            elif incomplete_text is None:
+                incomplete_text = marker.group('inc').strip()
+            if ends_incomplete and incomplete_text is not None:
+                break
         
-        # Clean up the markdown (remove EOL markers)
-        result['markdown'] = result['markdown'].replace('{EOL}', '').strip()
+        if not ends_incomplete:
+            return PageResult(markdown.strip())
         
-        return result
+        # Clean up the markdown (remove EOL markers)
+        return PageResult(
+            markdown.replace('{EOL}', '').strip(),
+            ends_incomplete=True,
+            incomplete_text=incomplete_text
+        )
     
     def test_connection(self) -> bool:
         """Test if the API connection is working."""
         try:
-            # Create a simple test image
+            # Create a simple test image (sent through the shared model/channel)
             test_img = Image.new('RGB', (100, 100), color='white')
             response = self.model.generate_content(["What color is this?", test_img])
             return bool(response.text)
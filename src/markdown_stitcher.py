@@ -1,9 +1,67 @@
+import io
 import logging
 import re
-from typing import List
+from functools import lru_cache
+from typing import List, Optional, TextIO, Tuple
+
+from rapidfuzz import fuzz
 
 logger = logging.getLogger(__name__)
 
+# Patterns used for every page/transition, compiled once
+_RE_MULTI_NL = re.compile(r'\n{3,}')
+_RE_HEADER_STRIP = re.compile(r'^(?P<hashes>#{1,6})\s+(?P<body>.*)$')
+
+# Markdown symbols ignored when comparing header text
+_MD_SYM_TRANS = str.maketrans('', '', '#*_[]')
+
+# Document-level cleanups. Blank-line collapsing, spacing before headers and
+# list-marker normalization share one left-to-right scan (see _final_sub).
+# Headers and list markers whose trailing whitespace runs straight into the
+# next one form a single match, which the callback rewrites with the
+# original per-rule patterns, so the result equals applying the rules one
+# after another. The blank-line branch leaves its last newline for a header
+# or list marker right after it.
+_RE_FINAL = re.compile(
+    r'(?P<blank>\n{3,})(?=\n)'
+    r'|\n(?:#{1,6}|[•\-\*])\s+(?:(?<=\n)(?:#{1,6}|[•\-\*])\s+)*'
+)
+_RE_BLANK4 = re.compile(r'\n{4,}')
+_RE_HEADER_SPACE = re.compile(r'\n(#{1,6}\s+)')
+_RE_LIST = re.compile(r'\n([•\-\*])\s+')
+# Lone page numbers are removed in a separate pass over the result; folding
+# them in would also delete runs of consecutive number-only lines
+_RE_PAGENUM = re.compile(r'\n\s*\d+\s*\n')
+
+
+def _final_sub(match: re.Match) -> str:
+    """Replacement for whichever _RE_FINAL alternative matched."""
+    if match.lastgroup == 'blank':
+        return '\n\n'
+    # A short run of headers/list markers (usually just one)
+    text = _RE_BLANK4.sub('\n\n\n', match.group())
+    text = _RE_HEADER_SPACE.sub(r'\n\n\1', text)
+    return _RE_LIST.sub(r'\n\1 ', text)
+
+
+@lru_cache(maxsize=1024)
+def _similar_text_cached(clean1: str, clean2: str, threshold: float) -> bool:
+    """Memoized body of MarkdownStitcher._similar_text (running headers repeat)."""
+    if not clean1 or not clean2:
+        return False
+
+    # Simple similarity: check if one contains most of the other
+    longer = max(clean1, clean2, key=len)
+    shorter = min(clean1, clean2, key=len)
+
+    if shorter in longer:
+        return True
+
+    # Normalized edit-distance ratio (0-100); with score_cutoff rapidfuzz
+    # stops early and returns 0 once the pair can't reach the threshold
+    cutoff = threshold * 100
+    return fuzz.ratio(clean1, clean2, score_cutoff=cutoff) >= cutoff
+
 
 class MarkdownStitcher:
     """
@@ -13,10 +71,19 @@ class MarkdownStitcher:
     - Removing duplicate headers across page breaks
     - Cleaning up excessive whitespace
     - Ensuring proper markdown structure
+    
+    Pages can either be collected with add_page() and joined with
+    stitch_all(), or streamed to an open file with write_page(), in which
+    case only page numbers and counters are kept in memory.
     """
     
     def __init__(self):
         self.pages = []
+        self.page_numbers = []
+        self.chars_written = 0
+        self._total_chars = 0
+        self._total_words = 0
+        self._previous_last_line: Optional[str] = None
         logger.info("Initialized MarkdownStitcher")
     
     def add_page(self, markdown: str, page_number: int):
@@ -25,7 +92,48 @@ class MarkdownStitcher:
             'number': page_number,
             'content': markdown
         })
-        logger.debug(f"Added page {page_number} to stitcher")
+        self._track_page(markdown, page_number)
+        logger.debug("Added page %d to stitcher", page_number)
+    
+    def write_page(self, fh: TextIO, markdown: str, page_number: int) -> int:
+        """
+        Clean a page and write it straight to an open output file.
+        
+        Pages must be written in page order. Cleanup that spans page
+        boundaries is limited to the separator between consecutive pages.
+        
+        Returns:
+            Number of characters written
+        """
+        is_first = self._previous_last_line is None
+        content, self._previous_last_line = self._stitch_page(
+            markdown,
+            self._previous_last_line
+        )
+        self._track_page(markdown, page_number)
+        
+        if not content:
+            return 0
+        
+        # Terminate the page with a newline so a trailing lone page number is
+        # still caught by the cleanup, then drop it again
+        text = self._cleanup_text(
+            (content if is_first else '\n\n' + content) + '\n'
+        ).rstrip()
+        if not self.chars_written:
+            # Nothing written yet (e.g. the first pages were empty): don't
+            # start the file with the separator, as stitch_all strips it too
+            text = text.lstrip()
+        fh.write(text)
+        self.chars_written += len(text)
+        logger.debug("Wrote page %d to output", page_number)
+        return len(text)
+    
+    def _track_page(self, markdown: str, page_number: int):
+        """Record page metadata used by get_stats()."""
+        self.page_numbers.append(page_number)
+        self._total_chars += len(markdown)
+        self._total_words += len(markdown.split())
     
     def stitch_all(self) -> str:
         """
@@ -43,30 +151,20 @@ class MarkdownStitcher:
         # Sort pages by number (in case they were added out of order)
         self.pages.sort(key=lambda x: x['number'])
         
-        stitched = []
+        buf = io.StringIO()
         previous_last_line = None
         
         for i, page in enumerate(self.pages):
-            content = page['content']
-            
-            # Clean up the content
-            content = self._clean_page_content(content)
-            
-            # Handle page transitions
-            if i > 0:
-                content = self._handle_page_transition(
-                    previous_last_line,
-                    content
-                )
-            
-            stitched.append(content)
-            
-            # Remember last line for next iteration
-            lines = content.strip().split('\n')
-            previous_last_line = lines[-1] if lines else ""
+            content, previous_last_line = self._stitch_page(
+                page['content'],
+                previous_last_line
+            )
+            # Pages are separated by a blank line
+            if i:
+                buf.write('\n\n')
+            buf.write(content)
         
-        # Join all pages
-        final_markdown = '\n\n'.join(stitched)
+        final_markdown = buf.getvalue()
         
         # Final cleanup
         final_markdown = self._final_cleanup(final_markdown)
@@ -74,15 +172,39 @@ class MarkdownStitcher:
         logger.info("Stitching complete")
         return final_markdown
     
-    def _clean_page_content(self, content: str) -> str:
-        """Clean up individual page content."""
-        # Remove excessive newlines (more than 2)
-        content = re.sub(r'\n{3,}', '\n\n', content)
+    def _stitch_page(
+        self,
+        content: str,
+        previous_last_line: Optional[str]
+    ) -> tuple[str, str]:
+        """
+        Clean one page and resolve its transition from the previous page.
+        
+        Args:
+            content: Raw page markdown
+            previous_last_line: Last line of the previous page (None for the first page)
+            
+        Returns:
+            (cleaned content, last line of this page)
+        """
+        # Clean up the content
+        content = self._clean_page_content(content)
         
-        # Remove trailing/leading whitespace
-        content = content.strip()
+        # Handle page transitions
+        if previous_last_line is not None:
+            content = self._handle_page_transition(
+                previous_last_line,
+                content
+            )
         
-        return content
+        # Remember last line for the next page. The content is already
+        # stripped (the transition only ever drops a leading line).
+        return content, content[content.rfind('\n') + 1:]
+    
+    def _clean_page_content(self, content: str) -> str:
+        """Clean up individual page content."""
+        # Trim first so the newline collapse runs over the final text only
+        return _RE_MULTI_NL.sub('\n\n', content.strip())
     
     def _handle_page_transition(
         self,
@@ -102,83 +224,69 @@ class MarkdownStitcher:
         if not previous_last_line or not current_content:
             return current_content
         
-        current_lines = current_content.split('\n')
-        if not current_lines:
+        previous_is_header, previous_body = self._parse_header(previous_last_line.strip())
+        if not previous_is_header:
             return current_content
         
-        current_first_line = current_lines[0].strip()
-        previous_cleaned = previous_last_line.strip()
+        first_line, _, rest = current_content.partition('\n')
+        current_first_line = first_line.strip()
+        current_is_header, current_body = self._parse_header(current_first_line)
         
-        # Check for duplicate headers
-        if (self._is_header(previous_cleaned) and 
-            self._is_header(current_first_line) and
-            self._similar_text(previous_cleaned, current_first_line)):
+        # Check for duplicate headers (compared without markdown symbols)
+        if current_is_header and self._similar_text(
+            previous_body.translate(_MD_SYM_TRANS).lower(),
+            current_body.translate(_MD_SYM_TRANS).lower()
+        ):
             # Remove duplicate header from current page
-            logger.debug(f"Removing duplicate header: {current_first_line}")
-            current_lines = current_lines[1:]
-            return '\n'.join(current_lines)
+            logger.debug("Removing duplicate header: %s", current_first_line)
+            return rest
         
         return current_content
     
-    def _is_header(self, line: str) -> bool:
-        """Check if a line is a markdown header."""
-        return bool(re.match(r'^#{1,6}\s+', line))
+    def _parse_header(self, line: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check if a line is a markdown header.
+        
+        Returns:
+            (True, header text without the leading #s) or (False, None)
+        """
+        match = _RE_HEADER_STRIP.match(line)
+        if match:
+            return True, match.group('body')
+        return False, None
     
     def _similar_text(self, text1: str, text2: str, threshold: float = 0.8) -> bool:
         """
         Check if two texts are similar (for duplicate detection).
         
-        Simple character-based similarity check.
+        Expects normalized text (markdown symbols removed, lower-cased).
+        Character-based similarity (rapidfuzz ratio). Arguments are put in a
+        fixed order before hitting the shared result cache, so both orders
+        give the same answer.
         """
-        # Remove markdown symbols for comparison
-        clean1 = re.sub(r'[#*_\[\]]', '', text1).lower()
-        clean2 = re.sub(r'[#*_\[\]]', '', text2).lower()
-        
-        if not clean1 or not clean2:
-            return False
-        
-        # Simple similarity: check if one contains most of the other
-        longer = max(clean1, clean2, key=len)
-        shorter = min(clean1, clean2, key=len)
-        
-        if shorter in longer:
-            return True
-        
-        # Character overlap ratio
-        common = sum(1 for a, b in zip(clean1, clean2) if a == b)
-        similarity = common / max(len(clean1), len(clean2))
-        
-        return similarity >= threshold
+        if text2 < text1:
+            text1, text2 = text2, text1
+        return _similar_text_cached(text1, text2, threshold)
     
     def _final_cleanup(self, markdown: str) -> str:
         """Final cleanup of the complete document."""
-        # Remove excessive blank lines
-        markdown = re.sub(r'\n{4,}', '\n\n\n', markdown)
-        
-        # Ensure consistent spacing around headers
-        markdown = re.sub(r'\n(#{1,6}\s+)', r'\n\n\1', markdown)
-        
-        # Clean up list formatting
-        markdown = re.sub(r'\n([•\-\*])\s+', r'\n\1 ', markdown)
+        return self._cleanup_text(markdown).strip()
+    
+    def _cleanup_text(self, markdown: str) -> str:
+        """Normalize spacing and strip OCR noise (shared by both output modes)."""
+        markdown = _RE_FINAL.sub(_final_sub, markdown)
         
         # Remove any remaining page artifacts (common OCR noise)
-        markdown = re.sub(r'\n\s*\d+\s*\n', '\n', markdown)  # Lone page numbers
-        
-        # Trim
-        markdown = markdown.strip()
-        
-        return markdown
+        return _RE_PAGENUM.sub('\n', markdown)  # Lone page numbers
     
     def get_stats(self) -> dict:
         """Get statistics about the stitched document."""
-        if not self.pages:
+        if not self.page_numbers:
             return {'total_pages': 0, 'total_chars': 0, 'total_words': 0}
         
-        all_content = ' '.join(p['content'] for p in self.pages)
-        
         return {
-            'total_pages': len(self.pages),
-            'total_chars': len(all_content),
-            'total_words': len(all_content.split()),
-            'avg_chars_per_page': len(all_content) // len(self.pages)
+            'total_pages': len(self.page_numbers),
+            'total_chars': self._total_chars,
+            'total_words': self._total_words,
+            'avg_chars_per_page': self._total_chars // len(self.page_numbers)
         }
\ No newline at end of file
@@ -1,27 +1,116 @@
-from pdf2image import convert_from_path
-from PIL import Image
-import PyPDF2
+import pypdfium2 as pdfium
+from PIL import Image, features
+import io
 import logging
+import multiprocessing
 import os
-from typing import Generator, Tuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Generator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
 
+def _render_page(pdf: pdfium.PdfDocument, page_num: int, dpi: int) -> Image.Image:
+    """Render one page (1-indexed) of an open document to an RGB image."""
+    page = pdf[page_num - 1]
+    try:
+        # PDF user space is 72 units per inch. PDFium renders BGR by default;
+        # rev_byteorder gives RGB directly so to_pil() needs no channel swap.
+        return page.render(scale=dpi / 72, rev_byteorder=True).to_pil()
+    finally:
+        page.close()
+
+
+def _rasterize_range(
+    pdf_path: str,
+    first_page: int,
+    last_page: int,
+    dpi: int
+) -> List[Image.Image]:
+    """Render a page range to images with PDFium (runs in a worker process)."""
+    pdf = pdfium.PdfDocument(pdf_path)
+    try:
+        return [
+            _render_page(pdf, page_num, dpi)
+            for page_num in range(first_page, min(last_page, len(pdf)) + 1)
+        ]
+    finally:
+        pdf.close()
+
+
 class PDFHandler:
-    """Handles PDF loading and page-by-page image extraction."""
+    """
+    Handles PDF loading and page-by-page image extraction.
+    
+    Pages are rendered at `dpi` (200 by default, enough for body text).
+    Pages that OCR can't read at that resolution can be rendered again with
+    rasterize_page() at `escalation_dpi` (300 by default).
+    """
     
-    def __init__(self, dpi: int = 300, image_quality: int = 85):
+    def __init__(
+        self,
+        dpi: int = 200,
+        image_quality: int = 75,
+        target_long_edge: int = 2048,
+        batch_size: int = 8,
+        workers: Optional[int] = None,
+        escalation_dpi: int = 300
+    ):
         self.dpi = dpi
         self.image_quality = image_quality
-        logger.info(f"Initialized PDFHandler (DPI: {dpi}, Quality: {image_quality})")
+        self.target_long_edge = target_long_edge
+        self.escalation_dpi = escalation_dpi
+        # Pages per rasterization job (one document open in the worker each)
+        self.batch_size = max(1, batch_size)
+        # Rendering processes; defaults to half the cores, leaving the rest
+        # for image encoding and the event loop
+        if workers is None:
+            workers = (os.cpu_count() or 2) // 2
+        self.workers = max(1, workers)
+        
+        # Open documents and page counts, keyed by (path, mtime) so an
+        # edited file is picked up again
+        self._documents: dict = {}
+        self._page_counts: dict = {}
+        
+        # The stock Pillow wheels bundle libjpeg-turbo (SIMD DCT/Huffman);
+        # a source build against plain libjpeg is several times slower
+        if not features.check_feature('libjpeg_turbo'):
+            logger.warning("Pillow is not using libjpeg-turbo; JPEG handling will be slower")
+        
+        logger.info(
+            f"Initialized PDFHandler (DPI: {dpi}, Quality: {image_quality}, "
+            f"Long edge: {target_long_edge}px, Render workers: {self.workers})"
+        )
+    
+    def _open_document(self, pdf_path: str) -> pdfium.PdfDocument:
+        """Return an open PdfDocument for the PDF, reusing a previous one."""
+        key = (pdf_path, os.path.getmtime(pdf_path))
+        pdf = self._documents.get(key)
+        if pdf is None:
+            # Drop handles to older versions of the same file
+            for stale in [k for k in self._documents if k[0] == pdf_path]:
+                self._documents.pop(stale).close()
+            pdf = self._documents[key] = pdfium.PdfDocument(pdf_path)
+        return pdf
+    
+    def rasterize_page(self, pdf_path: str, page_num: int, dpi: int) -> Image.Image:
+        """
+        Render a single page in-process at the given DPI.
+        
+        Used to re-render individual pages (e.g. at escalation_dpi); bulk
+        extraction goes through extract_pages().
+        """
+        return _render_page(self._open_document(pdf_path), page_num, dpi)
     
     def get_page_count(self, pdf_path: str) -> int:
         """Get total number of pages in PDF."""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                return len(pdf_reader.pages)
+            key = (pdf_path, os.path.getmtime(pdf_path))
+            count = self._page_counts.get(key)
+            if count is None:
+                count = self._page_counts[key] = len(self._open_document(pdf_path))
+            return count
         except Exception as e:
             logger.error(f"Error reading PDF metadata: {str(e)}")
             raise
@@ -35,7 +124,12 @@ class PDFHandler:
         """
         Generator that yields (page_number, image) tuples one at a time.
         
-        This approach minimizes memory usage by converting one page at a time.
+        Pages are rasterized ahead of the consumer by a process pool in
+        batches of batch_size pages. Batches may finish out of order; they
+        are held in a reorder buffer and pages are still yielded in order.
+        At most workers + 1 batches are outstanding, so memory stays bounded.
+        With a single worker, pages are rendered in-process from the already
+        open document instead.
         
         Args:
             pdf_path: Path to the PDF file
@@ -52,50 +146,123 @@ class PDFHandler:
         
         logger.info(f"Extracting pages {start_page} to {end_page} from {pdf_path}")
         
-        for page_num in range(start_page, end_page + 1):
-            try:
-                # Convert single page to image
-                images = convert_from_path(
-                    pdf_path,
-                    dpi=self.dpi,
-                    first_page=page_num,
-                    last_page=page_num,
-                    fmt='JPEG',
-                    jpegopt={'quality': self.image_quality, 'optimize': True}
-                )
+        if self.workers <= 1:
+            for page_num in range(start_page, end_page + 1):
+                # Same as the pool path, which clamps ranges to the document
+                if page_num > total_pages:
+                    logger.warning(f"No image extracted for page {page_num}")
+                    continue
+                try:
+                    image = self.rasterize_page(pdf_path, page_num, self.dpi)
+                except Exception as e:
+                    logger.error(f"Error extracting page {page_num}: {str(e)}")
+                    raise
+                logger.debug("Extracted page %d/%d", page_num, total_pages)
+                yield page_num, image
+            return
+        
+        batch_size = self.batch_size
+        ranges = iter([
+            (first, min(first + batch_size - 1, end_page))
+            for first in range(start_page, end_page + 1, batch_size)
+        ])
+        # Spawned rather than forked: by now the Gemini client's gRPC channel
+        # has live threads, and gRPC doesn't support fork. Workers only need
+        # the path and page range.
+        pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        running = {}  # future -> (first, last)
+        ready = {}    # page_num -> image (None if the page came back missing)
+        
+        def submit():
+            page_range = next(ranges, None)
+            if page_range is None:
+                return
+            first, last = page_range
+            future = pool.submit(
+                _rasterize_range, pdf_path, first, last, self.dpi
+            )
+            running[future] = page_range
+        
+        try:
+            for _ in range(self.workers):
+                submit()
+            
+            page_num = start_page
+            while page_num <= end_page:
+                if page_num not in ready:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        first, last = running.pop(future)
+                        try:
+                            images = future.result()
+                        except Exception as e:
+                            logger.error(f"Error extracting pages {first}-{last}: {str(e)}")
+                            raise
+                        for num in range(first, last + 1):
+                            offset = num - first
+                            ready[num] = images[offset] if offset < len(images) else None
+                    continue
                 
-                if images:
-                    logger.debug(f"Extracted page {page_num}/{total_pages}")
-                    yield page_num, images[0]
-                else:
+                # Keep the pool busy while the consumer works on this batch
+                if (page_num - start_page) % batch_size == 0:
+                    submit()
+                
+                image = ready.pop(page_num)
+                if image is None:
                     logger.warning(f"No image extracted for page {page_num}")
-                    
-            except Exception as e:
-                logger.error(f"Error extracting page {page_num}: {str(e)}")
-                raise
+                else:
+                    logger.debug("Extracted page %d/%d", page_num, total_pages)
+                    yield page_num, image
+                page_num += 1
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
     
-    def optimize_image(self, image: Image.Image) -> Image.Image:
+    def optimize_image(
+        self,
+        image: Image.Image,
+        long_edge: Optional[int] = None
+    ) -> bytes:
         """
-        Optimize image for OCR while keeping file size reasonable.
+        Optimize image for OCR and encode it for upload.
         
-        - Convert to RGB if needed
-        - Ensure reasonable dimensions (max 4000px width)
-        """
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        - Downscale so the longest side is at most long_edge pixels
+          (default target_long_edge; text OCR gains nothing from more,
+          and uploads shrink a lot)
+        - Encode once as JPEG; the bytes go to Gemini as-is
+        
+        Pages from extract_pages() are already RGB, so no mode conversion
+        is done here.
         
+        Returns:
+            JPEG-encoded image bytes
+        """
         # Limit maximum dimensions to prevent huge uploads
-        max_width = 4000
-        if image.width > max_width:
-            ratio = max_width / image.width
-            new_height = int(image.height * ratio)
-            image = image.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            logger.debug(f"Resized image to {max_width}x{new_height}")
-        
-        return image
+        edge = long_edge or self.target_long_edge
+        if max(image.size) > edge:
+            # Cheap filters are plenty for text; BOX averages whole source
+            # blocks, which is accurate once we shrink by 2x or more
+            if max(image.size) / edge >= 2:
+                resample = Image.Resampling.BOX
+            else:
+                resample = Image.Resampling.BILINEAR
+            image.thumbnail((edge, edge), resample)
+            logger.debug("Resized image to %dx%d", image.width, image.height)
+        
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=self.image_quality, optimize=True)
+        return buffer.getvalue()
     
-    def validate_pdf(self, pdf_path: str) -> bool:
-        """Check if PDF is valid and readable."""
+    def validate_pdf(self, pdf_path: str, deep: bool = False) -> bool:
+        """
+        Check if PDF is valid and readable.
+        
+        By default only the file header is checked; get_page_count() will
+        fail on a broken file anyway. With deep=True the whole document is
+        parsed as well.
+        """
         if not os.path.exists(pdf_path):
             logger.error(f"PDF file not found: {pdf_path}")
             return False
@@ -105,9 +272,24 @@ class PDFHandler:
             return False
         
         try:
+            # Readers accept the %PDF- marker anywhere in the first 1 KiB
             with open(pdf_path, 'rb') as file:
-                PyPDF2.PdfReader(file)
+                head = file.read(1024)
+        except OSError as e:
+            logger.error(f"Cannot read PDF file: {str(e)}")
+            return False
+        
+        if b'%PDF-' not in head:
+            logger.error(f"Invalid PDF file (missing %PDF- header): {pdf_path}")
+            return False
+        
+        if not deep:
+            return True
+        
+        try:
+            # Parse with PDFium; the open document is kept for later calls
+            self._open_document(pdf_path)
             return True
         except Exception as e:
             logger.error(f"Invalid PDF file: {str(e)}")
-            return False
\ No newline at end of file
+            return False